@@ -0,0 +1,174 @@
+"""
+Benchmark: tempo de import, cold start e latência de busca
+"""
+import subprocess
+import sys
+import time
+from pathlib import Path
+import numpy as np
+
+# Adiciona o diretório raiz ao path
+ROOT = Path(__file__).parent
+sys.path.insert(0, str(ROOT))
+
+ENTRY_MODULES = [
+    'src.embedding_service',
+    'src.index_builder',
+    'src.search_engine',
+    'search',
+    'validate'
+]
+
+HEAVY_MODULES = ['torch', 'sentence_transformers', 'transformers']
+
+
+def measure_import_time(module_name: str) -> dict:
+    """
+    Mede o tempo de import de um módulo em um interpretador novo
+
+    Args:
+        module_name: Nome do módulo
+
+    Returns:
+        Dicionário com tempo (s) e módulos pesados carregados no import
+    """
+    code = (
+        "import sys, time\n"
+        f"sys.path.insert(0, {str(ROOT)!r})\n"
+        "start = time.perf_counter()\n"
+        f"import {module_name}\n"
+        "elapsed = time.perf_counter() - start\n"
+        f"heavy = [m for m in {HEAVY_MODULES!r} if m in sys.modules]\n"
+        "print(elapsed)\n"
+        "print(','.join(heavy))\n"
+    )
+    output = subprocess.run(
+        [sys.executable, '-c', code], capture_output=True, text=True, check=True
+    ).stdout.splitlines()
+
+    return {
+        'seconds': float(output[0]),
+        'heavy_modules': [m for m in output[1].split(',') if m] if len(output) > 1 else []
+    }
+
+
+def benchmark_imports():
+    """Tempo de import dos pontos de entrada"""
+    print("Tempo de import (interpretador novo):")
+    for module_name in ENTRY_MODULES:
+        try:
+            result = measure_import_time(module_name)
+        except subprocess.CalledProcessError as e:
+            print(f"  {module_name:<24} erro: {e.stderr.strip().splitlines()[-1]}")
+            continue
+
+        heavy = f"  (carregou {', '.join(result['heavy_modules'])})" if result['heavy_modules'] else ""
+        print(f"  {module_name:<24} {result['seconds'] * 1000:8.1f} ms{heavy}")
+
+
+def _percentiles(samples: list) -> str:
+    values = np.array(samples) * 1000
+    return (f"p50 {np.percentile(values, 50):.1f} ms | "
+            f"p99 {np.percentile(values, 99):.1f} ms | n={len(values)}")
+
+
+def _load_queries(dataframe, n_queries: int) -> list:
+    """Queries de teste do notebook, ou amostra do próprio DNE"""
+    import pandas as pd
+
+    queries_file = ROOT / 'data' / 'test_queries.parquet'
+    source = pd.read_parquet(queries_file) if queries_file.exists() else dataframe
+
+    fields = ['logradouro', 'bairro', 'cidade', 'uf', 'cep']
+    sample = source.head(n_queries)
+    return [
+        {f: ('' if pd.isna(row[f]) else str(row[f])) for f in fields}
+        for _, row in sample.iterrows()
+    ]
+
+
+def benchmark_search(indices_dir: str, n_queries: int = 100):
+    """Cold start, aquecimento do modelo e latência de busca"""
+    from src.embedding_service import EmbeddingService
+    from src.index_builder import IndexBuilder
+    from src.search_engine import SearchEngine
+
+    if IndexBuilder.find_snapshot(indices_dir) is None:
+        print(f"\nÍndices não encontrados em {indices_dir}; benchmark de busca ignorado")
+        return
+
+    start = time.perf_counter()
+    embedding_service = EmbeddingService()
+    builder = IndexBuilder(embedding_service)
+    indices, dataframe = builder.load_indices(indices_dir)
+    engine = SearchEngine(embedding_service, indices, dataframe, builder.manifest)
+    print(f"\nCold start (índices carregados, modelo não): {time.perf_counter() - start:.2f}s")
+
+    queries = _load_queries(dataframe, n_queries)
+
+    # Queries só com CEP não devem carregar o modelo
+    cep_latencies = []
+    for query in queries:
+        if not query['cep']:
+            continue
+        cep_query = {'cep': query['cep'], 'uf': query['uf']}
+        t0 = time.perf_counter()
+        engine.search(cep_query)
+        cep_latencies.append(time.perf_counter() - t0)
+    if cep_latencies:
+        print(f"Busca só por CEP: {_percentiles(cep_latencies)} "
+              f"(modelo carregado: {embedding_service.is_loaded})")
+
+    embedding_service.warmup()
+
+    latencies = []
+    for query in queries:
+        t0 = time.perf_counter()
+        engine.search(query)
+        latencies.append(time.perf_counter() - t0)
+    print(f"Busca completa: {_percentiles(latencies)}")
+
+    # Mesmas queries de novo: respostas vêm do cache
+    cached_latencies = []
+    for query in queries:
+        t0 = time.perf_counter()
+        engine.search(query)
+        cached_latencies.append(time.perf_counter() - t0)
+    stats = engine.cache_stats()
+    if stats:
+        print(f"Busca repetida (cache): {_percentiles(cached_latencies)} | "
+              f"taxa de acerto {stats['hit_rate']:.1%}")
+
+    # Sem cache, para medir o executor sobre buscas reais
+    engine.result_cache = None
+    benchmark_executor(engine, queries)
+
+
+def benchmark_executor(engine, queries: list, concurrency_levels=(1, 2, 4)):
+    """Busca concorrente via QueryExecutor: tempo em fila vs tempo de serviço"""
+    from src.query_executor import QueryExecutor
+
+    print("\nQueryExecutor (tempo em fila vs serviço):")
+    for max_concurrency in concurrency_levels:
+        with QueryExecutor(engine, max_concurrency=max_concurrency, batch_threshold=len(queries) + 1) as executor:
+            t0 = time.perf_counter()
+            executor.search_many(queries)
+            elapsed = time.perf_counter() - t0
+            stats = executor.stats()
+
+        print(f"  concorrência {max_concurrency} ({stats['threads_per_query']} threads/busca): "
+              f"{len(queries) / elapsed:.1f} q/s | "
+              f"fila p99 {stats['queue_wait_ms']['p99']:.1f} ms | "
+              f"serviço p50 {stats['service_time_ms']['p50']:.1f} ms, "
+              f"p99 {stats['service_time_ms']['p99']:.1f} ms")
+
+    with QueryExecutor(engine) as executor:
+        t0 = time.perf_counter()
+        executor.search_batch(queries)
+        elapsed = time.perf_counter() - t0
+    print(f"  lote único ({executor.total_threads} threads): {len(queries) / elapsed:.1f} q/s")
+
+
+if __name__ == '__main__':
+    benchmark_imports()
+    benchmark_search(str(ROOT / 'data' / 'indices'))
@@ -36,6 +36,7 @@ DEFAULT_SEARCH_K = 100  # Candidatos intermediários por campo
 # Paths
 DATA_DIR = 'data'
 INDICES_DIR = 'data/indices'
+EMBEDDING_CACHE_DIR = 'data/embedding_cache'  # Cache persistente de embeddings por modelo
 NOTEBOOKS_DIR = 'notebooks'
 
 # Dataset sintético
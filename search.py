@@ -23,7 +23,7 @@ def load_or_build_search_engine():
     embedding_service = EmbeddingService()
     
     # Verifica se índices existem
-    if (indices_path / 'metadata.pkl').exists():
+    if IndexBuilder.find_snapshot(str(indices_path)) is not None:
         print("Carregando índices existentes...")
         index_builder = IndexBuilder(embedding_service)
         indices, dataframe = index_builder.load_indices(str(indices_path))
@@ -36,7 +36,8 @@ def load_or_build_search_engine():
     search_engine = SearchEngine(
         embedding_service=embedding_service,
         indices=indices,
-        dataframe=dataframe
+        dataframe=dataframe,
+        manifest=index_builder.manifest
     )
     
     return search_engine
@@ -65,26 +66,25 @@ def search_address(logradouro='', bairro='', cidade='', uf='', cep='', top_k=5):
     }
     
     print(f"\nBuscando por: {query}\n")
-    result_json = search_engine.search(query, top_k=top_k)
-    result = json.loads(result_json)
+    response = search_engine.search(query, top_k=top_k)
     
     print("="*70)
     print(f"RESULTADOS (Top-{top_k})")
     print("="*70)
     
-    for i, res in enumerate(result['results'], 1):
-        addr = res['address']
-        print(f"\n#{i} - Score: {res['score']:.3f} | Confiança: {res['confidence'].upper()}")
+    for i, match in enumerate(response, 1):
+        addr = match.address
+        print(f"\n#{i} - Score: {match.score:.3f} | Confiança: {match.confidence.upper()}")
         print(f"  Logradouro: {addr['logradouro']}")
         print(f"  Bairro: {addr['bairro']}")
         print(f"  Cidade: {addr['cidade']} - {addr['uf']}")
         print(f"  CEP: {addr['cep']}")
         
-        if res.get('field_scores'):
-            print(f"  Scores por campo: {json.dumps(res['field_scores'], indent=4)}")
+        if match.field_scores:
+            print(f"  Scores por campo: {json.dumps(match.field_scores, indent=4)}")
     
     print("\n" + "="*70)
-    print(f"Pesos utilizados: {result['weights_used']}")
+    print(f"Pesos utilizados: {response.weights_used}")
     print("="*70)
 
 
@@ -0,0 +1,172 @@
+"""
+EmbeddingCache: Armazenamento persistente de embeddings endereçado por conteúdo
+"""
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+from typing import List, Optional
+import numpy as np
+
+
+KEY_SIZE = 16  # bytes do hash BLAKE2b do texto normalizado
+
+
+class EmbeddingCache:
+    """
+    Cache em disco de embeddings por (fingerprint do modelo, hash do texto normalizado)
+
+    Cada fingerprint tem seu próprio diretório com dois arquivos append-only:
+    keys.bin (hashes concatenados) e vectors.f32 (matriz float32 lida via
+    memória mapeada). A linha i de vectors.f32 corresponde ao hash i de keys.bin.
+    Pensado para um único processo escritor por vez.
+    """
+
+    def __init__(self, cache_dir: str, fingerprint: str, embedding_dim: int):
+        """
+        Abre (ou cria) o cache
+
+        Args:
+            cache_dir: Diretório raiz do cache
+            fingerprint: Fingerprint do modelo/normalização (EmbeddingService.fingerprint)
+            embedding_dim: Dimensão dos embeddings
+        """
+        self.path = Path(cache_dir) / fingerprint
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.fingerprint = fingerprint
+        self.embedding_dim = embedding_dim
+
+        self._keys_file = self.path / "keys.bin"
+        self._vectors_file = self.path / "vectors.f32"
+        self._lock = threading.Lock()
+        self._rows = {}
+        self._vectors = None
+
+        self._check_meta()
+        self._load()
+
+    @staticmethod
+    def key(normalized_text: str) -> bytes:
+        """Hash do texto já normalizado"""
+        return hashlib.blake2b(normalized_text.encode('utf-8'), digest_size=KEY_SIZE).digest()
+
+    @staticmethod
+    def stored_dim(cache_dir: str, fingerprint: str) -> Optional[int]:
+        """
+        Dimensão registrada em um cache existente
+
+        Returns:
+            Dimensão dos embeddings, ou None se o cache ainda não existe
+        """
+        meta_file = Path(cache_dir) / fingerprint / "meta.json"
+        if not meta_file.exists():
+            return None
+        with open(meta_file, 'r', encoding='utf-8') as f:
+            return json.load(f)['embedding_dim']
+
+    def _check_meta(self):
+        meta_file = self.path / "meta.json"
+        if meta_file.exists():
+            with open(meta_file, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            if meta['embedding_dim'] != self.embedding_dim:
+                raise ValueError(
+                    f"Cache {self.path} tem dimensão {meta['embedding_dim']}, "
+                    f"esperado {self.embedding_dim}"
+                )
+        else:
+            with open(meta_file, 'w', encoding='utf-8') as f:
+                json.dump({'fingerprint': self.fingerprint, 'embedding_dim': self.embedding_dim}, f)
+
+    def _load(self):
+        """Carrega o índice de chaves e mapeia a matriz de vetores"""
+        self._keys_file.touch(exist_ok=True)
+        self._vectors_file.touch(exist_ok=True)
+
+        row_bytes = self.embedding_dim * 4
+        n_keys = self._keys_file.stat().st_size // KEY_SIZE
+        n_vectors = self._vectors_file.stat().st_size // row_bytes
+        n_rows = min(n_keys, n_vectors)
+
+        # Descarta escrita parcial de uma execução interrompida
+        if self._keys_file.stat().st_size != n_rows * KEY_SIZE:
+            os.truncate(self._keys_file, n_rows * KEY_SIZE)
+        if self._vectors_file.stat().st_size != n_rows * row_bytes:
+            os.truncate(self._vectors_file, n_rows * row_bytes)
+
+        keys = self._keys_file.read_bytes()
+        self._rows = {keys[i * KEY_SIZE:(i + 1) * KEY_SIZE]: i for i in range(n_rows)}
+        self._map_vectors(n_rows)
+
+    def _map_vectors(self, n_rows: int):
+        if n_rows == 0:
+            self._vectors = None
+        else:
+            self._vectors = np.memmap(
+                self._vectors_file, dtype=np.float32, mode='r',
+                shape=(n_rows, self.embedding_dim)
+            )
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def lookup(self, keys: List[bytes]) -> np.ndarray:
+        """
+        Localiza chaves no cache
+
+        Args:
+            keys: Lista de hashes
+
+        Returns:
+            Array com a linha de cada chave (-1 se ausente)
+        """
+        with self._lock:
+            return np.array([self._rows.get(k, -1) for k in keys], dtype=np.int64)
+
+    def get(self, rows: np.ndarray) -> np.ndarray:
+        """
+        Lê vetores do cache
+
+        Args:
+            rows: Linhas retornadas por lookup (todas >= 0)
+
+        Returns:
+            Matriz de embeddings (N x dim)
+        """
+        with self._lock:
+            if len(rows) == 0:
+                return np.empty((0, self.embedding_dim), dtype=np.float32)
+            return np.asarray(self._vectors[rows], dtype=np.float32)
+
+    def add(self, keys: List[bytes], vectors: np.ndarray):
+        """
+        Acrescenta novos embeddings ao cache
+
+        Args:
+            keys: Hashes dos textos
+            vectors: Matriz de embeddings (N x dim) na mesma ordem
+        """
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+
+        with self._lock:
+            new = []
+            seen = set()
+            for i, k in enumerate(keys):
+                if k not in self._rows and k not in seen:
+                    seen.add(k)
+                    new.append(i)
+            if not new:
+                return
+
+            # Vetores antes das chaves: uma interrupção deixa no máximo
+            # vetores órfãos, descartados no próximo _load
+            with open(self._vectors_file, 'ab') as f:
+                f.write(vectors[new].tobytes())
+            with open(self._keys_file, 'ab') as f:
+                f.write(b''.join(keys[i] for i in new))
+
+            start = len(self._rows)
+            for offset, i in enumerate(new):
+                self._rows[keys[i]] = start + offset
+            self._map_vectors(len(self._rows))
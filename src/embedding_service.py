@@ -1,26 +1,214 @@
 """
 EmbeddingService: Normalização de texto e geração de embeddings para endereços brasileiros
 """
+import hashlib
+import json
+import os
 import re
+import threading
+import time
+from pathlib import Path
 from typing import Dict, Optional
 import numpy as np
-from sentence_transformers import SentenceTransformer
 from unidecode import unidecode
+from .embedding_cache import EmbeddingCache
+
+
+# Incrementar sempre que normalize_text mudar: embeddings antigos deixam de ser válidos
+NORMALIZATION_VERSION = 1
 
 
 class EmbeddingService:
     """Serviço para normalização e geração de embeddings de endereços"""
     
-    def __init__(self, model_name: str = "neuralmind/bert-base-portuguese-cased"):
+    def __init__(
+        self,
+        model_name: str = "neuralmind/bert-base-portuguese-cased",
+        cache_dir: Optional[str] = None,
+        revision: Optional[str] = None
+    ):
         """
         Inicializa o serviço de embeddings
         
+        O modelo (e sentence-transformers/torch) só é carregado no primeiro
+        embedding efetivamente necessário, ou ao chamar warmup().
+        
         Args:
             model_name: Nome do modelo sentence-transformers
+            cache_dir: Diretório do cache persistente de embeddings (opcional).
+                Quando definido, embed_batch só executa o modelo para textos novos.
+            revision: Revisão do modelo no Hugging Face Hub (branch, tag ou
+                commit; default: main). Requer sentence-transformers >= 2.3
+        """
+        self.model_name = model_name
+        self.cache_dir = cache_dir
+        self.revision = revision
+        
+        self._model = None
+        self._model_revision = None
+        self._embedding_dim = None
+        self._cache = None
+        self._load_lock = threading.Lock()
+    
+    @property
+    def model(self):
+        """Modelo sentence-transformers, carregado no primeiro acesso"""
+        if self._model is None:
+            with self._load_lock:
+                if self._model is None:
+                    print(f"Carregando modelo de embeddings: {self.model_name}")
+                    from sentence_transformers import SentenceTransformer
+                    
+                    # revision só existe a partir do sentence-transformers 2.3
+                    kwargs = {'revision': self.revision} if self.revision else {}
+                    model = SentenceTransformer(self.model_name, **kwargs)
+                    self._embedding_dim = model.get_sentence_embedding_dimension()
+                    self._model = model
+        return self._model
+    
+    @property
+    def is_loaded(self) -> bool:
+        return self._model is not None
+    
+    @property
+    def embedding_dim(self) -> int:
+        """Dimensão dos embeddings (carrega o modelo se ainda não for conhecida)"""
+        if self._embedding_dim is None:
+            self.model
+        return self._embedding_dim
+    
+    @property
+    def cache(self) -> Optional[EmbeddingCache]:
+        """Cache persistente de embeddings, aberto no primeiro acesso"""
+        if self._cache is None and self.cache_dir:
+            # A dimensão gravada no cache evita carregar o modelo quando tudo é hit
+            dim = self._embedding_dim or EmbeddingCache.stored_dim(self.cache_dir, self.fingerprint)
+            self._cache = EmbeddingCache(self.cache_dir, self.fingerprint, dim or self.embedding_dim)
+        return self._cache
+    
+    def warmup(self) -> float:
+        """
+        Carrega o modelo e executa um encode de aquecimento
+        
+        Returns:
+            Tempo gasto em segundos
+        """
+        start = time.perf_counter()
+        self.model.encode("rua", convert_to_numpy=True, show_progress_bar=False)
+        elapsed = time.perf_counter() - start
+        print(f"Modelo aquecido em {elapsed:.2f}s")
+        return elapsed
+    
+    @property
+    def model_revision(self) -> str:
+        """
+        Identificador do conteúdo do modelo
+        
+        Para um checkpoint local, hash dos arquivos (configuração, pesos e
+        tokenizer); para um modelo do Hub, o commit resolvido no cache local.
+        Não carrega o modelo, exceto se ele ainda não foi baixado.
+        
+        Returns:
+            Commit do Hub ou "sha256:<hash>"
+        """
+        if self._model_revision is None:
+            revision = self._resolve_revision()
+            if revision is None:
+                # Modelo ainda não baixado: o carregamento baixa e popula o cache
+                self.model
+                revision = self._resolve_revision()
+            if revision is None:
+                revision = self._hash_loaded_weights()
+            self._model_revision = revision
+        return self._model_revision
+    
+    def _resolve_revision(self) -> Optional[str]:
+        """Resolve a revisão sem carregar o modelo (None se não for possível)"""
+        local_path = Path(self.model_name)
+        if local_path.is_dir():
+            return 'sha256:' + self._hash_model_dir(local_path)
+        
+        if self.revision and re.fullmatch(r'[0-9a-f]{40}', self.revision):
+            return self.revision
+        
+        hub_cache = os.environ.get('HF_HUB_CACHE') or os.path.join(
+            os.environ.get('HF_HOME', os.path.join(os.path.expanduser('~'), '.cache', 'huggingface')), 'hub'
+        )
+        ref_file = Path(hub_cache) / f"models--{self.model_name.replace('/', '--')}" / 'refs' / (self.revision or 'main')
+        if ref_file.exists():
+            return ref_file.read_text(encoding='utf-8').strip()
+        
+        return None
+    
+    @staticmethod
+    def _hash_model_dir(model_dir: Path) -> str:
+        """
+        SHA-256 de todos os arquivos de um checkpoint local (caminho + conteúdo)
+        
+        O hash é gravado em model_dir/.fingerprint.json junto com tamanho e
+        mtime de cada arquivo; enquanto nenhum arquivo mudar, o hash é
+        reaproveitado sem reler os pesos. Em diretórios somente leitura o
+        hash é recalculado a cada processo.
+        """
+        files = sorted(
+            f for f in model_dir.rglob('*')
+            if f.is_file() and not any(part.startswith('.') for part in f.relative_to(model_dir).parts)
+        )
+        stats = {}
+        for f in files:
+            stat = f.stat()
+            stats[f.relative_to(model_dir).as_posix()] = [stat.st_size, stat.st_mtime_ns]
+        
+        digest_file = model_dir / '.fingerprint.json'
+        try:
+            with open(digest_file, 'r', encoding='utf-8') as fh:
+                stored = json.load(fh)
+            if stored.get('files') == stats:
+                return stored['sha256']
+        except (OSError, ValueError, KeyError):
+            pass
+        
+        digest = hashlib.sha256()
+        for f in files:
+            digest.update(f.relative_to(model_dir).as_posix().encode('utf-8'))
+            with open(f, 'rb') as fh:
+                for chunk in iter(lambda: fh.read(1 << 20), b''):
+                    digest.update(chunk)
+        
+        try:
+            with open(digest_file, 'w', encoding='utf-8') as fh:
+                json.dump({'files': stats, 'sha256': digest.hexdigest()}, fh)
+        except OSError:
+            pass
+        
+        return digest.hexdigest()
+    
+    def _hash_loaded_weights(self) -> str:
+        """SHA-256 dos pesos do modelo carregado (último recurso)"""
+        digest = hashlib.sha256()
+        for name, tensor in self.model.state_dict().items():
+            digest.update(name.encode('utf-8'))
+            digest.update(tensor.detach().cpu().numpy().tobytes())
+        return 'sha256:' + digest.hexdigest()
+    
+    @property
+    def fingerprint(self) -> str:
         """
-        print(f"Carregando modelo de embeddings: {model_name}")
-        self.model = SentenceTransformer(model_name)
-        self.embedding_dim = self.model.get_sentence_embedding_dimension()
+        Identificador do espaço de embeddings (modelo, revisão dos pesos e
+        versão da normalização)
+        
+        Returns:
+            Hash hexadecimal curto
+        """
+        payload = json.dumps(
+            {
+                'model_name': self.model_name,
+                'model_revision': self.model_revision,
+                'normalization_version': NORMALIZATION_VERSION
+            },
+            sort_keys=True
+        )
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
     
     @staticmethod
     def normalize_text(text: str) -> str:
@@ -101,12 +289,45 @@ class EmbeddingService:
         
         return embeddings
     
-    def embed_batch(self, texts: list) -> np.ndarray:
+    def embed_queries(self, texts: list) -> np.ndarray:
+        """
+        Gera embeddings para um lote de textos de query
+        
+        Equivale a embed_text aplicado a cada texto (vazio após a normalização
+        vira vetor zero), em um único encode. Não consulta nem grava o cache
+        persistente, reservado aos textos indexados.
+        
+        Args:
+            texts: Lista de textos
+            
+        Returns:
+            Matriz de embeddings (N x dim)
+        """
+        normalized_texts = [self.normalize_text(t) for t in texts]
+        embeddings = np.zeros((len(texts), self.embedding_dim), dtype=np.float32)
+        
+        # Cada texto distinto e não vazio é embedado uma única vez
+        unique_texts = list(dict.fromkeys(t for t in normalized_texts if t))
+        if unique_texts:
+            encoded = self.model.encode(
+                unique_texts, 
+                convert_to_numpy=True, 
+                show_progress_bar=False,
+                batch_size=32
+            )
+            position = {t: i for i, t in enumerate(unique_texts)}
+            rows = [i for i, t in enumerate(normalized_texts) if t]
+            embeddings[rows] = encoded[[position[normalized_texts[i]] for i in rows]]
+        
+        return embeddings
+    
+    def embed_batch(self, texts: list, show_progress_bar: bool = True) -> np.ndarray:
         """
         Gera embeddings para um lote de textos
         
         Args:
             texts: Lista de textos
+            show_progress_bar: Exibe barra de progresso do encode
             
         Returns:
             Matriz de embeddings (N x dim)
@@ -116,11 +337,37 @@ class EmbeddingService:
         # Substitui textos vazios por placeholder para evitar erros
         normalized_texts = [t if t else " " for t in normalized_texts]
         
-        embeddings = self.model.encode(
-            normalized_texts, 
-            convert_to_numpy=True, 
-            show_progress_bar=True,
-            batch_size=32
-        )
+        # Cada texto distinto é embedado uma única vez
+        unique_texts = list(dict.fromkeys(normalized_texts))
+        position = {t: i for i, t in enumerate(unique_texts)}
+        inverse = np.fromiter((position[t] for t in normalized_texts), dtype=np.int64, count=len(normalized_texts))
+        
+        cache = self.cache
+        if cache is not None:
+            keys = [cache.key(t) for t in unique_texts]
+            rows = cache.lookup(keys)
+            hits = np.flatnonzero(rows >= 0)
+            misses = np.flatnonzero(rows < 0)
+            unique_embeddings = np.empty((len(unique_texts), cache.embedding_dim), dtype=np.float32)
+            unique_embeddings[hits] = cache.get(rows[hits])
+        else:
+            misses = np.arange(len(unique_texts))
+            unique_embeddings = np.empty((len(unique_texts), self.embedding_dim), dtype=np.float32)
+        
+        if len(misses) > 0:
+            encoded = self.model.encode(
+                [unique_texts[i] for i in misses], 
+                convert_to_numpy=True, 
+                show_progress_bar=show_progress_bar,
+                batch_size=32
+            )
+            unique_embeddings[misses] = encoded.astype(np.float32)
+            
+            if cache is not None:
+                cache.add([keys[i] for i in misses], unique_embeddings[misses])
+        
+        if cache is not None and show_progress_bar:
+            print(f"Embeddings: {len(unique_texts)} textos distintos, "
+                  f"{len(unique_texts) - len(misses)} do cache, {len(misses)} gerados")
         
-        return embeddings.astype(np.float32)
+        return unique_embeddings[inverse]
@@ -1,13 +1,22 @@
 """
 IndexBuilder: Construção de índices FAISS por campo de endereço
 """
+import hashlib
+import json
 import os
+import shutil
+from datetime import datetime, timezone
 from pathlib import Path
+from typing import Optional
 import pandas as pd
 import numpy as np
 import faiss
-import pickle
-from .embedding_service import EmbeddingService
+from .embedding_service import EmbeddingService, NORMALIZATION_VERSION
+
+
+SNAPSHOT_FORMAT_VERSION = 1
+MANIFEST_FILE = "manifest.json"
+CURRENT_FILE = "CURRENT"
 
 
 class IndexBuilder:
@@ -23,6 +32,7 @@ class IndexBuilder:
         self.embedding_service = embedding_service
         self.indices = {}
         self.dataframe = None
+        self.manifest = None
     
     def build_indices(self, df: pd.DataFrame, fields: list = None) -> dict:
         """
@@ -61,56 +71,280 @@ class IndexBuilder:
         
         return self.indices
     
-    def save_indices(self, output_dir: str):
+    def save_indices(self, output_dir: str, version: str = None) -> str:
         """
-        Salva índices FAISS e dataframe em disco
+        Salva um snapshot versionado dos índices FAISS e do dataframe
+        
+        Cada snapshot fica em output_dir/<versão>/ com um manifest.json
+        (modelo, parâmetros dos índices, número de registros e checksums).
+        O arquivo output_dir/CURRENT aponta para o snapshot ativo e só é
+        atualizado depois que o snapshot está completo em disco.
         
         Args:
-            output_dir: Diretório para salvar os arquivos
+            output_dir: Diretório raiz dos snapshots
+            version: Nome da versão (default: timestamp UTC)
+            
+        Returns:
+            Caminho do snapshot salvo
         """
         output_path = Path(output_dir)
         output_path.mkdir(parents=True, exist_ok=True)
         
+        if version is None:
+            version = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S%fZ')
+        
+        snapshot_path = output_path / version
+        if snapshot_path.exists():
+            raise FileExistsError(f"Snapshot já existe: {snapshot_path}")
+        
+        # Escreve em diretório temporário e renomeia ao final
+        tmp_path = output_path / f".tmp-{version}"
+        if tmp_path.exists():
+            shutil.rmtree(tmp_path)
+        tmp_path.mkdir()
+        
         # Salva cada índice FAISS
+        fields = {}
         for field, index in self.indices.items():
-            index_file = output_path / f"{field}_index.faiss"
-            faiss.write_index(index, str(index_file))
+            index_file = f"{field}_index.faiss"
+            faiss.write_index(index, str(tmp_path / index_file))
+            fields[field] = {
+                'file': index_file,
+                'type': type(index).__name__,
+                'metric_type': int(index.metric_type),
+                'dim': int(index.d),
+                'ntotal': int(index.ntotal)
+            }
         
         # Salva dataframe original
-        df_file = output_path / "addresses.parquet"
-        self.dataframe.to_parquet(df_file, index=False)
-        
-        # Salva metadados
-        metadata = {
-            'fields': list(self.indices.keys()),
-            'n_records': len(self.dataframe),
-            'embedding_dim': self.embedding_service.embedding_dim
+        df_file = "addresses.parquet"
+        self.dataframe.to_parquet(tmp_path / df_file, index=False)
+        
+        # Checksums calculados uma única vez, na publicação; a carga confere
+        # só os tamanhos (checksums completos são opcionais)
+        files = sorted(tmp_path.iterdir())
+        checksums = {f.name: self._file_checksum(f) for f in files}
+        sizes = {f.name: f.stat().st_size for f in files}
+        
+        manifest = {
+            'format_version': SNAPSHOT_FORMAT_VERSION,
+            'version': version,
+            'created_at': datetime.now(timezone.utc).isoformat(),
+            'embedding_model': {
+                'name': self.embedding_service.model_name,
+                'revision': self.embedding_service.model_revision,
+                'fingerprint': self.embedding_service.fingerprint,
+                'normalization_version': NORMALIZATION_VERSION,
+                'embedding_dim': self.embedding_service.embedding_dim
+            },
+            'fields': fields,
+            'records': {
+                'file': df_file,
+                'n_records': len(self.dataframe)
+            },
+            'checksums': checksums,
+            'sizes': sizes
         }
-        metadata_file = output_path / "metadata.pkl"
-        with open(metadata_file, 'wb') as f:
-            pickle.dump(metadata, f)
+        with open(tmp_path / MANIFEST_FILE, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        
+        os.rename(tmp_path, snapshot_path)
+        
+        # Atualiza ponteiro para o snapshot ativo de forma atômica
+        current_tmp = output_path / f".{CURRENT_FILE}.tmp"
+        current_tmp.write_text(version, encoding='utf-8')
+        os.replace(current_tmp, output_path / CURRENT_FILE)
+        
+        self.manifest = manifest
+        return str(snapshot_path)
     
-    def load_indices(self, input_dir: str):
+    @staticmethod
+    def find_snapshot(input_dir: str) -> Optional[Path]:
         """
-        Carrega índices FAISS e dataframe do disco
+        Resolve o diretório do snapshot a carregar
         
         Args:
-            input_dir: Diretório com os arquivos salvos
+            input_dir: Diretório de um snapshot ou raiz com arquivo CURRENT
+            
+        Returns:
+            Caminho do snapshot, ou None se não houver snapshot
         """
         input_path = Path(input_dir)
         
-        # Carrega metadados
-        metadata_file = input_path / "metadata.pkl"
-        with open(metadata_file, 'rb') as f:
-            metadata = pickle.load(f)
+        if (input_path / MANIFEST_FILE).exists():
+            return input_path
+        
+        current_file = input_path / CURRENT_FILE
+        if current_file.exists():
+            snapshot_path = input_path / current_file.read_text(encoding='utf-8').strip()
+            if (snapshot_path / MANIFEST_FILE).exists():
+                return snapshot_path
+        
+        return None
+    
+    @classmethod
+    def read_manifest(cls, input_dir: str) -> tuple:
+        """
+        Localiza um snapshot e lê seu manifesto
+        
+        Args:
+            input_dir: Diretório de um snapshot ou raiz com arquivo CURRENT
+            
+        Returns:
+            Tupla (caminho do snapshot, manifesto)
+            
+        Raises:
+            FileNotFoundError: Se não houver snapshot em input_dir
+        """
+        snapshot_path = cls.find_snapshot(input_dir)
+        if snapshot_path is None:
+            raise FileNotFoundError(f"Nenhum snapshot encontrado em {input_dir}")
+        
+        with open(snapshot_path / MANIFEST_FILE, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        
+        return snapshot_path, manifest
+    
+    def validate_snapshot(self, input_dir: str, verify_checksums: bool = False) -> tuple:
+        """
+        Localiza um snapshot e valida formato, modelo de embeddings e arquivos
+        
+        Args:
+            input_dir: Diretório de um snapshot ou raiz com arquivo CURRENT
+            verify_checksums: Confere também os checksums SHA-256 (lê todos os arquivos)
+            
+        Returns:
+            Tupla (caminho do snapshot, manifesto)
+            
+        Raises:
+            FileNotFoundError: Se não houver snapshot em input_dir
+            ValueError: Se o snapshot for incompatível ou estiver corrompido
+        """
+        snapshot_path, manifest = self.read_manifest(input_dir)
+        self._validate_manifest(snapshot_path, manifest, verify_checksums)
+        return snapshot_path, manifest
+    
+    @staticmethod
+    def _file_checksum(path: Path) -> str:
+        """Calcula SHA-256 de um arquivo em blocos"""
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+    
+    def _validate_manifest(self, snapshot_path: Path, manifest: dict, verify_checksums: bool):
+        """
+        Valida formato, modelo de embeddings, tamanhos e (opcionalmente)
+        checksums dos arquivos de um snapshot
+        
+        Raises:
+            ValueError: Se o snapshot for incompatível ou estiver corrompido
+        """
+        if manifest.get('format_version') != SNAPSHOT_FORMAT_VERSION:
+            raise ValueError(
+                f"Formato de snapshot não suportado: {manifest.get('format_version')} "
+                f"(esperado {SNAPSHOT_FORMAT_VERSION})"
+            )
+        
+        if self.embedding_service is not None:
+            expected = self.embedding_service.fingerprint
+            found = manifest['embedding_model']['fingerprint']
+            if found != expected:
+                raise ValueError(
+                    f"Snapshot {manifest['version']} foi construído com outro modelo/normalização "
+                    f"({manifest['embedding_model']['name']}@{manifest['embedding_model'].get('revision')}, "
+                    f"fingerprint {found}); serviço atual usa "
+                    f"{self.embedding_service.model_name}@{self.embedding_service.model_revision} "
+                    f"(fingerprint {expected})"
+                )
+        
+        if 'sizes' not in manifest:
+            raise ValueError(f"Manifesto de {snapshot_path} sem os tamanhos dos arquivos")
+        
+        for file_name, size in manifest['sizes'].items():
+            file_path = snapshot_path / file_name
+            if not file_path.exists() or file_path.stat().st_size != size:
+                raise ValueError(f"Arquivo ausente ou com tamanho inválido: {file_path}")
+        
+        if verify_checksums:
+            for file_name, checksum in manifest['checksums'].items():
+                if self._file_checksum(snapshot_path / file_name) != checksum:
+                    raise ValueError(f"Checksum inválido em {snapshot_path / file_name}")
+    
+    def load_indices(self, input_dir: str, shared: bool = False, verify_checksums: bool = False):
+        """
+        Carrega índices FAISS e dataframe de um snapshot
+        
+        Args:
+            input_dir: Diretório de um snapshot ou raiz com arquivo CURRENT
+            shared: Carrega em buffers somente leitura (índices mapeados do
+                arquivo e colunas em Arrow), para compartilhar páginas entre
+                processos filhos após fork
+            verify_checksums: Confere os checksums SHA-256 do manifesto antes de
+                carregar (lê todos os arquivos; por padrão só os tamanhos são
+                conferidos)
+        """
+        # Carrega e valida manifesto
+        snapshot_path, manifest = self.validate_snapshot(input_dir, verify_checksums)
         
         # Carrega dataframe
-        df_file = input_path / "addresses.parquet"
-        self.dataframe = pd.read_parquet(df_file)
+        df_file = snapshot_path / manifest['records']['file']
+        if shared:
+            # Colunas Arrow não criam um objeto Python por linha, então o
+            # contador de referências não "suja" as páginas herdadas no fork
+            dataframe = pd.read_parquet(df_file, dtype_backend='pyarrow')
+        else:
+            dataframe = pd.read_parquet(df_file)
+        
+        if len(dataframe) != manifest['records']['n_records']:
+            raise ValueError(
+                f"Snapshot {manifest['version']}: {len(dataframe)} registros, "
+                f"manifesto indica {manifest['records']['n_records']}"
+            )
         
         # Carrega índices FAISS
-        for field in metadata['fields']:
-            index_file = input_path / f"{field}_index.faiss"
-            self.indices[field] = faiss.read_index(str(index_file))
+        indices = {}
+        for field, params in manifest['fields'].items():
+            index_file = snapshot_path / params['file']
+            if shared:
+                indices[field] = self._read_index_shared(index_file)
+            else:
+                indices[field] = faiss.read_index(str(index_file))
+            
+            if indices[field].ntotal != len(dataframe):
+                raise ValueError(
+                    f"Índice {field} com {indices[field].ntotal} vetores para {len(dataframe)} registros"
+                )
+        
+        self.indices = indices
+        self.dataframe = dataframe
+        self.manifest = manifest
         
         return self.indices, self.dataframe
+    
+    @staticmethod
+    def _read_index_shared(index_file: Path) -> faiss.Index:
+        """
+        Lê índice FAISS em modo somente leitura, mapeando o arquivo em memória
+        
+        IO_FLAG_MMAP só mapeia índices IVF; os vetores de um IndexFlat são
+        mapeados com IO_FLAG_MMAP_IFC (versões recentes do FAISS). Sem ele,
+        o índice fica no heap do pai e é compartilhado só por copy-on-write.
+        
+        Args:
+            index_file: Arquivo .faiss
+            
+        Returns:
+            Índice FAISS
+        """
+        mmap_flag = getattr(faiss, 'IO_FLAG_MMAP_IFC', None)
+        if mmap_flag is None:
+            mmap_flag = getattr(faiss, 'IO_FLAG_MMAP', 0)
+        flags = getattr(faiss, 'IO_FLAG_READ_ONLY', 0) | mmap_flag
+        try:
+            return faiss.read_index(str(index_file), flags)
+        except RuntimeError:
+            # Versões do FAISS sem mmap para este tipo de índice: carrega na
+            # memória do processo pai, que é compartilhada copy-on-write
+            return faiss.read_index(str(index_file))
@@ -0,0 +1,243 @@
+"""
+Prefork: Servidor com workers que compartilham uma única cópia dos índices
+"""
+import gc
+import os
+import signal
+import sys
+import tempfile
+import traceback
+from multiprocessing.connection import Client, Listener
+from typing import Dict, List
+import faiss
+from .embedding_service import EmbeddingService
+from .index_builder import IndexBuilder
+from .search_engine import SearchEngine
+
+
+def memory_usage(pid='self') -> Dict[str, float]:
+    """
+    Lê uso de memória residente e compartilhada de um processo (Linux)
+
+    Args:
+        pid: PID do processo ('self' para o processo atual)
+
+    Returns:
+        Dicionário com rss, shared, private e pss em MB
+
+    Raises:
+        OSError: Se /proc/<pid>/smaps_rollup não existir (macOS, kernels antigos)
+    """
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup", 'r') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 2 and parts[0].endswith(':') and parts[1].isdigit():
+                fields[parts[0][:-1]] = int(parts[1])
+
+    shared = fields.get('Shared_Clean', 0) + fields.get('Shared_Dirty', 0)
+    private = fields.get('Private_Clean', 0) + fields.get('Private_Dirty', 0)
+
+    return {
+        'pid': os.getpid() if pid == 'self' else int(pid),
+        'rss_mb': fields.get('Rss', 0) / 1024,
+        'shared_mb': shared / 1024,
+        'private_mb': private / 1024,
+        'pss_mb': fields.get('Pss', 0) / 1024
+    }
+
+
+class PreforkSearchServer:
+    """Carrega índices no processo pai e atende buscas em workers via fork"""
+
+    def __init__(
+        self,
+        indices_dir: str,
+        n_workers: int = 4,
+        model_name: str = "neuralmind/bert-base-portuguese-cased",
+        address: str = None,
+        threads_per_worker: int = 1
+    ):
+        """
+        Inicializa o servidor
+
+        Args:
+            indices_dir: Diretório com os índices salvos
+            n_workers: Número de processos worker
+            model_name: Nome do modelo sentence-transformers
+            address: Caminho do Unix socket (default: arquivo temporário)
+            threads_per_worker: Threads FAISS/torch por worker
+        """
+        if not hasattr(os, 'fork'):
+            raise RuntimeError("Modo prefork requer os.fork (Linux/macOS)")
+
+        self.indices_dir = indices_dir
+        self.n_workers = n_workers
+        self.model_name = model_name
+        self.address = address or os.path.join(tempfile.mkdtemp(prefix='dne_prefork_'), 'search.sock')
+        self.threads_per_worker = threads_per_worker
+        self.authkey = os.urandom(16)
+
+        self.search_engine = None
+        self._listener = None
+        self._workers: List[int] = []
+
+    def start(self):
+        """
+        Carrega modelo, índices e registros no pai e faz fork dos workers
+
+        Deve ser chamado antes de qualquer busca no processo pai: pools de
+        threads criados antes do fork não sobrevivem nos filhos.
+        """
+        embedding_service = EmbeddingService(self.model_name)
+        # Carrega os pesos sem encode: o pool de threads do torch não sobrevive ao fork
+        embedding_service.model
+        builder = IndexBuilder(embedding_service)
+        indices, dataframe = builder.load_indices(self.indices_dir, shared=True)
+        self.search_engine = SearchEngine(embedding_service, indices, dataframe, builder.manifest)
+        # Lookup de CEP construído no pai, para ser compartilhado pelos workers
+        self.search_engine.prepare_cep_index()
+
+        self._listener = Listener(self.address, family='AF_UNIX', authkey=self.authkey)
+
+        # Move objetos já carregados para a geração permanente, evitando que
+        # o GC toque (e copie) as páginas herdadas pelos workers
+        gc.collect()
+        gc.freeze()
+
+        for _ in range(self.n_workers):
+            pid = os.fork()
+            if pid == 0:
+                code = 0
+                try:
+                    self._worker_loop()
+                except BaseException:
+                    code = 1
+                    print(f"Worker {os.getpid()} encerrado por erro:", file=sys.stderr)
+                    traceback.print_exc()
+                    sys.stderr.flush()
+                finally:
+                    os._exit(code)
+            self._workers.append(pid)
+
+        gc.unfreeze()
+        print(f"{self.n_workers} workers atendendo em {self.address}")
+
+    def _worker_loop(self):
+        """Loop do processo worker: aceita conexões e atende requisições"""
+        signal.signal(signal.SIGTERM, lambda *_: os._exit(0))
+
+        faiss.omp_set_num_threads(self.threads_per_worker)
+        torch = sys.modules.get('torch')
+        if torch is not None:
+            torch.set_num_threads(self.threads_per_worker)
+
+        # Relatório de memória é informativo: indisponível fora do Linux
+        try:
+            report = memory_usage()
+            print(f"Worker {report['pid']}: RSS {report['rss_mb']:.0f} MB "
+                  f"(compartilhada {report['shared_mb']:.0f} MB, privada {report['private_mb']:.0f} MB)")
+        except OSError:
+            print(f"Worker {os.getpid()}: relatório de memória indisponível neste sistema")
+
+        while True:
+            conn = self._listener.accept()
+            try:
+                while True:
+                    try:
+                        command, payload = conn.recv()
+                    except EOFError:
+                        break
+
+                    try:
+                        if command == 'search':
+                            # Borda do serviço: serializa em JSON compacto
+                            conn.send((True, self.search_engine.search(**payload).to_json()))
+                        elif command == 'memory':
+                            conn.send((True, memory_usage()))
+                        else:
+                            conn.send((False, f"Comando desconhecido: {command}"))
+                    except Exception as e:
+                        conn.send((False, repr(e)))
+            finally:
+                conn.close()
+
+    def worker_memory(self) -> List[Dict[str, float]]:
+        """
+        Uso de memória de cada worker (residente vs compartilhada, Linux)
+
+        Returns:
+            Lista com um relatório de memória por worker
+        """
+        return [memory_usage(pid) for pid in self._workers]
+
+    def stop(self):
+        """Encerra os workers e fecha o socket"""
+        for pid in self._workers:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        for pid in self._workers:
+            try:
+                os.waitpid(pid, 0)
+            except ChildProcessError:
+                pass
+        self._workers = []
+
+        if self._listener is not None:
+            self._listener.close()
+            self._listener = None
+
+    def client(self) -> 'PreforkClient':
+        """Cria um cliente conectado a este servidor"""
+        return PreforkClient(self.address, self.authkey)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+
+class PreforkClient:
+    """Cliente de um PreforkSearchServer"""
+
+    def __init__(self, address: str, authkey: bytes):
+        """
+        Conecta ao servidor
+
+        Args:
+            address: Caminho do Unix socket
+            authkey: Chave de autenticação do servidor
+        """
+        self.conn = Client(address, family='AF_UNIX', authkey=authkey)
+
+    def _request(self, command: str, payload: dict = None):
+        self.conn.send((command, payload))
+        ok, body = self.conn.recv()
+        if not ok:
+            raise RuntimeError(body)
+        return body
+
+    def search(self, query: Dict[str, str], top_k: int = 5, search_k: int = 100) -> str:
+        """
+        Realiza busca em um worker
+
+        Args:
+            query: Dicionário com campos {logradouro, bairro, cidade, uf, cep}
+            top_k: Número de resultados a retornar
+            search_k: Número de candidatos intermediários por campo
+
+        Returns:
+            JSON string compacta com resultados estruturados
+        """
+        return self._request('search', {'query': query, 'top_k': top_k, 'search_k': search_k})
+
+    def memory(self) -> Dict[str, float]:
+        """Relatório de memória do worker que atende esta conexão"""
+        return self._request('memory')
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,205 @@
+"""
+QueryExecutor: Execução concorrente de buscas com controle de threads FAISS/torch
+"""
+import os
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Optional
+import numpy as np
+import faiss
+from .results import BatchSearchResult, SearchResponse
+from .search_engine import SearchEngine
+
+
+class QueryExecutor:
+    """
+    Executor de buscas com número fixo de buscas simultâneas
+
+    Cada busca roda com total_threads // max_concurrency threads de
+    OpenMP (FAISS) e intra-op (torch), evitando que buscas paralelas
+    disputem os mesmos núcleos. Lotes grandes são executados com
+    search_batch usando todas as threads, com exclusividade.
+    """
+
+    def __init__(
+        self,
+        search_engine: SearchEngine,
+        max_concurrency: Optional[int] = None,
+        total_threads: Optional[int] = None,
+        batch_threshold: int = 32,
+        stats_window: int = 10000
+    ):
+        """
+        Inicializa o executor
+
+        Args:
+            search_engine: Motor de busca
+            max_concurrency: Buscas simultâneas (default: total_threads)
+            total_threads: Threads disponíveis para FAISS/torch (default: núcleos da máquina)
+            batch_threshold: A partir deste tamanho, search_many usa o caminho em lote
+            stats_window: Número de medições mantidas para as estatísticas
+        """
+        self.search_engine = search_engine
+        self.total_threads = total_threads or os.cpu_count() or 1
+        self.max_concurrency = max_concurrency or self.total_threads
+        self.threads_per_query = max(1, self.total_threads // self.max_concurrency)
+        self.batch_threshold = batch_threshold
+
+        self._pool = ThreadPoolExecutor(self.max_concurrency, thread_name_prefix='search')
+        self._slots = threading.BoundedSemaphore(self.max_concurrency)
+        self._batch_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._queue_wait = deque(maxlen=stats_window)
+        self._service_time = deque(maxlen=stats_window)
+        self._batch_sizes = deque(maxlen=stats_window)
+
+        # Valores do processo, restaurados em shutdown()
+        self._previous_faiss_threads = faiss.omp_get_max_threads()
+        self._previous_torch_threads = None
+
+        self._apply_threads(self.threads_per_query)
+
+    def _apply_threads(self, n_threads: int):
+        """Fixa o número de threads do FAISS e, se já importado, do torch"""
+        faiss.omp_set_num_threads(n_threads)
+        torch = sys.modules.get('torch')
+        if torch is not None and torch.get_num_threads() != n_threads:
+            # Torch pode ser importado depois do executor: guarda o valor
+            # original na primeira alteração
+            if self._previous_torch_threads is None:
+                self._previous_torch_threads = torch.get_num_threads()
+            torch.set_num_threads(n_threads)
+
+    def _restore_threads(self):
+        """Restaura o número de threads do FAISS e do torch anterior ao executor"""
+        faiss.omp_set_num_threads(self._previous_faiss_threads)
+        torch = sys.modules.get('torch')
+        if torch is not None and self._previous_torch_threads is not None:
+            torch.set_num_threads(self._previous_torch_threads)
+            self._previous_torch_threads = None
+
+    def _record(self, queue_wait: float, service_time: float, batch_size: int = 1):
+        with self._stats_lock:
+            self._queue_wait.append(queue_wait)
+            self._service_time.append(service_time)
+            self._batch_sizes.append(batch_size)
+
+    def _run(self, submitted_at: float, query: Dict[str, str], top_k: int, search_k: int) -> SearchResponse:
+        with self._slots:
+            started_at = time.perf_counter()
+            # Torch pode ter sido importado depois da criação do executor
+            self._apply_threads(self.threads_per_query)
+            try:
+                return self.search_engine.search(query, top_k=top_k, search_k=search_k)
+            finally:
+                self._record(started_at - submitted_at, time.perf_counter() - started_at)
+
+    def submit(self, query: Dict[str, str], top_k: int = 5, search_k: int = 100) -> Future:
+        """
+        Enfileira uma busca
+
+        Args:
+            query: Dicionário com campos {logradouro, bairro, cidade, uf, cep}
+            top_k: Número de resultados a retornar
+            search_k: Número de candidatos intermediários por campo
+
+        Returns:
+            Future com a SearchResponse
+        """
+        return self._pool.submit(self._run, time.perf_counter(), query, top_k, search_k)
+
+    def search(self, query: Dict[str, str], top_k: int = 5, search_k: int = 100) -> SearchResponse:
+        """Busca síncrona através do executor"""
+        return self.submit(query, top_k, search_k).result()
+
+    def search_batch(self, queries: List[Dict[str, str]], top_k: int = 5, search_k: int = 100) -> BatchSearchResult:
+        """
+        Executa um lote com paralelismo dentro do lote
+
+        Ocupa todas as vagas do executor enquanto roda, para que as threads
+        do lote não concorram com buscas individuais.
+
+        Args:
+            queries: Lista de queries
+            top_k: Número de resultados por query
+            search_k: Número de candidatos intermediários por campo
+
+        Returns:
+            BatchSearchResult colunar
+        """
+        submitted_at = time.perf_counter()
+        with self._batch_lock:
+            for _ in range(self.max_concurrency):
+                self._slots.acquire()
+            try:
+                started_at = time.perf_counter()
+                self._apply_threads(self.total_threads)
+                try:
+                    return self.search_engine.search_batch(queries, top_k=top_k, search_k=search_k)
+                finally:
+                    self._apply_threads(self.threads_per_query)
+                    self._record(started_at - submitted_at, time.perf_counter() - started_at, len(queries))
+            finally:
+                for _ in range(self.max_concurrency):
+                    self._slots.release()
+
+    def search_many(self, queries: List[Dict[str, str]], top_k: int = 5, search_k: int = 100) -> List[SearchResponse]:
+        """
+        Busca várias queries escolhendo a estratégia de paralelismo
+
+        Lotes com batch_threshold queries ou mais usam search_batch
+        (paralelismo dentro do lote); lotes menores são distribuídos entre
+        as buscas simultâneas (paralelismo entre queries).
+
+        Returns:
+            Lista de SearchResponse, na ordem das queries
+        """
+        if len(queries) >= self.batch_threshold:
+            return self.search_batch(queries, top_k=top_k, search_k=search_k).responses()
+
+        futures = [self.submit(q, top_k, search_k) for q in queries]
+        return [f.result() for f in futures]
+
+    def stats(self) -> dict:
+        """
+        Estatísticas de tempo em fila e tempo de serviço (ms)
+
+        Returns:
+            Dicionário com contagens e percentis
+        """
+        with self._stats_lock:
+            queue_wait = np.array(self._queue_wait) * 1000
+            service_time = np.array(self._service_time) * 1000
+            n_queries = int(sum(self._batch_sizes))
+
+        def summarize(values: np.ndarray) -> dict:
+            if len(values) == 0:
+                return {'mean': 0.0, 'p50': 0.0, 'p99': 0.0}
+            return {
+                'mean': float(values.mean()),
+                'p50': float(np.percentile(values, 50)),
+                'p99': float(np.percentile(values, 99))
+            }
+
+        return {
+            'executions': len(queue_wait),
+            'queries': n_queries,
+            'max_concurrency': self.max_concurrency,
+            'threads_per_query': self.threads_per_query,
+            'queue_wait_ms': summarize(queue_wait),
+            'service_time_ms': summarize(service_time)
+        }
+
+    def shutdown(self, wait: bool = True):
+        """Encerra o pool de threads e restaura o número de threads do processo"""
+        self._pool.shutdown(wait=wait)
+        self._restore_threads()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.shutdown()
@@ -0,0 +1,117 @@
+"""
+ResultCache: Cache LRU com TTL para respostas de busca
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+
+class ResultCache:
+    """
+    Cache LRU limitado com expiração por TTL e métricas de acerto
+
+    clear() incrementa a geração do cache; put() com uma geração antiga é
+    ignorado, para que buscas iniciadas antes de uma troca de snapshot não
+    reinsiram resultados obsoletos.
+    """
+
+    def __init__(self, max_size: int = 1024, ttl: float = 300.0):
+        """
+        Inicializa o cache
+
+        Args:
+            max_size: Número máximo de entradas
+            ttl: Tempo de vida de cada entrada em segundos
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """
+        Busca uma entrada válida
+
+        Args:
+            key: Chave da entrada
+
+        Returns:
+            Valor armazenado, ou None se ausente/expirado
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value: Any, generation: Optional[int] = None):
+        """
+        Armazena uma entrada, removendo a menos recente se o cache estiver cheio
+
+        Args:
+            key: Chave da entrada
+            value: Valor a armazenar
+            generation: Geração lida antes de calcular o valor (opcional)
+        """
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """Remove todas as entradas e invalida buscas em andamento"""
+        with self._lock:
+            self._entries.clear()
+            self._generation += 1
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        """
+        Métricas do cache
+
+        Returns:
+            Dicionário com acertos, falhas, remoções e taxa de acerto
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
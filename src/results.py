@@ -0,0 +1,301 @@
+"""
+Results: Objetos de resultado de busca, sem serialização até a borda do serviço
+"""
+import json
+from typing import Dict, List, Optional
+import numpy as np
+import pandas as pd
+
+
+ADDRESS_FIELDS = ['logradouro', 'bairro', 'cidade', 'uf', 'cep']
+SCORED_FIELDS = ['logradouro', 'bairro', 'cidade', 'cep']
+
+
+def dumps(obj) -> str:
+    """Serializa em JSON compacto (sem indentação nem espaços)"""
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':'))
+
+
+def confidence_level(score: float, high_threshold: float = 0.8, medium_threshold: float = 0.6) -> str:
+    """
+    Nível de confiança de um score
+
+    Args:
+        score: Score final do candidato
+        high_threshold: Score mínimo para confiança alta
+        medium_threshold: Score mínimo para confiança média
+
+    Returns:
+        "high", "medium" ou "low"
+    """
+    if score >= high_threshold:
+        return "high"
+    if score >= medium_threshold:
+        return "medium"
+    return "low"
+
+
+def _address_from_row(dataframe: pd.DataFrame, row_id: int) -> Dict[str, Optional[str]]:
+    row = dataframe.iloc[row_id]
+    return {
+        field: (None if pd.isna(row[field]) else row[field])
+        for field in ADDRESS_FIELDS
+    }
+
+
+class AddressMatch:
+    """Um candidato encontrado; o endereço só é lido do DataFrame quando acessado"""
+
+    __slots__ = ('row_id', 'score', 'confidence', 'field_scores', '_dataframe', '_address')
+
+    def __init__(
+        self,
+        row_id: int,
+        score: float,
+        confidence: str,
+        field_scores: Dict[str, float],
+        dataframe: Optional[pd.DataFrame] = None,
+        address: Optional[Dict[str, Optional[str]]] = None
+    ):
+        """
+        Args:
+            row_id: Linha do registro no DataFrame do snapshot
+            score: Score final
+            confidence: Nível de confiança
+            field_scores: Score por campo
+            dataframe: DataFrame de onde o endereço é materializado
+            address: Endereço já materializado (ex.: vindo de outro processo)
+        """
+        self.row_id = row_id
+        self.score = score
+        self.confidence = confidence
+        self.field_scores = field_scores
+        self._dataframe = dataframe
+        self._address = address
+
+    @property
+    def address(self) -> Dict[str, Optional[str]]:
+        """Campos do endereço (logradouro, bairro, cidade, uf, cep)"""
+        if self._address is None:
+            self._address = _address_from_row(self._dataframe, self.row_id)
+        return self._address
+
+    def copy(self) -> 'AddressMatch':
+        """Cópia independente (scores por campo e endereço copiados)"""
+        return AddressMatch(
+            self.row_id,
+            self.score,
+            self.confidence,
+            dict(self.field_scores),
+            self._dataframe,
+            dict(self._address) if self._address is not None else None
+        )
+
+    def to_dict(self) -> dict:
+        return {
+            "address": self.address,
+            "score": self.score,
+            "confidence": self.confidence,
+            "field_scores": self.field_scores
+        }
+
+    def __repr__(self) -> str:
+        return f"AddressMatch(row_id={self.row_id}, score={self.score:.3f}, confidence={self.confidence!r})"
+
+
+class SearchResponse:
+    """Resposta de uma busca: candidatos ordenados por score"""
+
+    __slots__ = ('results', 'query', 'weights_used', 'extra')
+
+    def __init__(
+        self,
+        results: List[AddressMatch],
+        query: Dict[str, str],
+        weights_used: Dict[str, float],
+        extra: Optional[dict] = None
+    ):
+        """
+        Args:
+            results: Candidatos ordenados por score
+            query: Query original
+            weights_used: Pesos aplicados por campo
+            extra: Campos adicionais da resposta (ex.: shards consultados)
+        """
+        self.results = results
+        self.query = query
+        self.weights_used = weights_used
+        self.extra = extra
+
+    @property
+    def total_found(self) -> int:
+        return len(self.results)
+
+    def __len__(self) -> int:
+        return len(self.results)
+
+    def __iter__(self):
+        return iter(self.results)
+
+    def __getitem__(self, i: int) -> AddressMatch:
+        return self.results[i]
+
+    def with_query(self, query: Dict[str, str]) -> 'SearchResponse':
+        """
+        Cópia da resposta associada a outra query
+
+        Candidatos, scores e pesos são copiados: alterações feitas por quem
+        recebe a resposta não afetam a original (ex.: a guardada em cache).
+        """
+        return SearchResponse(
+            [r.copy() for r in self.results],
+            query,
+            dict(self.weights_used),
+            dict(self.extra) if self.extra is not None else None
+        )
+
+    def to_dict(self) -> dict:
+        """Resposta no formato de dicionário (materializa os endereços)"""
+        response = {
+            "results": [r.to_dict() for r in self.results],
+            "query": self.query,
+            "total_found": self.total_found,
+            "weights_used": self.weights_used
+        }
+        if self.extra:
+            response.update(self.extra)
+        return response
+
+    def to_json(self, indent: Optional[int] = None) -> str:
+        """
+        Serializa a resposta (compacta por padrão)
+
+        Args:
+            indent: Indentação, para leitura humana
+
+        Returns:
+            JSON string
+        """
+        if indent is None:
+            return dumps(self.to_dict())
+        return json.dumps(self.to_dict(), ensure_ascii=False, indent=indent)
+
+    def __repr__(self) -> str:
+        return f"SearchResponse(total_found={self.total_found}, results={self.results!r})"
+
+
+class BatchSearchResult:
+    """
+    Resultados de um lote em formato colunar
+
+    Uma linha por (query, posição no ranking), com arrays numpy para
+    query_index, rank, row_id, score e o score de cada campo (NaN quando o
+    campo não participou). Pode ser gravado direto em Parquet.
+    """
+
+    def __init__(
+        self,
+        query_index: np.ndarray,
+        rank: np.ndarray,
+        row_id: np.ndarray,
+        score: np.ndarray,
+        field_scores: Dict[str, np.ndarray],
+        queries: List[Dict[str, str]],
+        weights_used: List[Dict[str, float]],
+        dataframe: pd.DataFrame,
+        confidence_threshold: float = 0.8
+    ):
+        self.query_index = query_index
+        self.rank = rank
+        self.row_id = row_id
+        self.score = score
+        self.field_scores = field_scores
+        self.queries = queries
+        self.weights_used = weights_used
+        self.dataframe = dataframe
+        self.confidence_threshold = confidence_threshold
+
+    def __len__(self) -> int:
+        return len(self.queries)
+
+    @property
+    def confidence(self) -> np.ndarray:
+        """Nível de confiança de cada linha"""
+        return np.select(
+            [self.score >= self.confidence_threshold, self.score >= 0.6],
+            ["high", "medium"],
+            default="low"
+        )
+
+    def columns(self, include_address: bool = True) -> Dict[str, np.ndarray]:
+        """
+        Colunas do resultado
+
+        Args:
+            include_address: Inclui os campos do endereço de cada candidato
+
+        Returns:
+            Dicionário nome -> array
+        """
+        columns = {
+            'query_index': self.query_index,
+            'rank': self.rank,
+            'row_id': self.row_id,
+            'score': self.score,
+            'confidence': self.confidence
+        }
+        for field in SCORED_FIELDS:
+            columns[f'score_{field}'] = self.field_scores[field]
+
+        if include_address:
+            addresses = self.dataframe.iloc[self.row_id]
+            for field in ADDRESS_FIELDS:
+                columns[field] = addresses[field].to_numpy()
+
+        return columns
+
+    def to_pandas(self, include_address: bool = True) -> pd.DataFrame:
+        return pd.DataFrame(self.columns(include_address))
+
+    def to_arrow(self, include_address: bool = True):
+        """Tabela pyarrow com as colunas do resultado"""
+        import pyarrow as pa
+
+        return pa.table(self.columns(include_address))
+
+    def to_parquet(self, path: str, include_address: bool = True):
+        """
+        Grava o resultado em Parquet
+
+        Args:
+            path: Arquivo de saída
+            include_address: Inclui os campos do endereço de cada candidato
+        """
+        import pyarrow.parquet as pq
+
+        pq.write_table(self.to_arrow(include_address), path)
+
+    def response(self, i: int) -> SearchResponse:
+        """Resposta da i-ésima query como SearchResponse"""
+        # Linhas estão agrupadas por query, em ordem crescente
+        start, end = np.searchsorted(self.query_index, [i, i + 1])
+        rows = range(start, end)
+        results = [
+            AddressMatch(
+                row_id=int(self.row_id[r]),
+                score=float(self.score[r]),
+                confidence=confidence_level(float(self.score[r]), self.confidence_threshold),
+                field_scores={
+                    field: float(self.field_scores[field][r])
+                    for field in SCORED_FIELDS
+                    if not np.isnan(self.field_scores[field][r])
+                },
+                dataframe=self.dataframe
+            )
+            for r in rows
+        ]
+        return SearchResponse(results, self.queries[i], self.weights_used[i])
+
+    def responses(self) -> List[SearchResponse]:
+        """Uma SearchResponse por query, na ordem do lote"""
+        return [self.response(i) for i in range(len(self.queries))]
@@ -1,12 +1,27 @@
 """
 SearchEngine: Motor de busca com scoring dinâmico e multi-campo
 """
-import json
+import threading
 from typing import Dict, List, Optional
 import numpy as np
 import faiss
 import pandas as pd
 from .embedding_service import EmbeddingService
+from .index_builder import IndexBuilder
+from .result_cache import ResultCache
+from .results import AddressMatch, BatchSearchResult, SearchResponse, SCORED_FIELDS, confidence_level
+
+
+class _IndexSnapshot:
+    """Conjunto imutável de índices + registros usado por uma busca"""
+    
+    __slots__ = ('indices', 'dataframe', 'manifest', 'cep_index')
+    
+    def __init__(self, indices: Dict[str, faiss.Index], dataframe: pd.DataFrame, manifest: Optional[dict] = None):
+        self.indices = indices
+        self.dataframe = dataframe
+        self.manifest = manifest
+        self.cep_index = None  # Construído sob demanda (ou em prepare_cep_index)
 
 
 class SearchEngine:
@@ -16,7 +31,10 @@ class SearchEngine:
         self, 
         embedding_service: EmbeddingService,
         indices: Dict[str, faiss.Index],
-        dataframe: pd.DataFrame
+        dataframe: pd.DataFrame,
+        manifest: Optional[dict] = None,
+        result_cache_size: int = 1024,
+        result_cache_ttl: float = 300.0
     ):
         """
         Inicializa o motor de busca
@@ -25,10 +43,17 @@ class SearchEngine:
             embedding_service: Serviço de embeddings
             indices: Dicionário com índices FAISS por campo
             dataframe: DataFrame original com endereços
+            manifest: Manifesto do snapshot carregado (opcional)
+            result_cache_size: Máximo de respostas em cache (0 desativa)
+            result_cache_ttl: Tempo de vida (s) de cada resposta em cache
         """
         self.embedding_service = embedding_service
-        self.indices = indices
-        self.dataframe = dataframe
+        self._snapshot = _IndexSnapshot(indices, dataframe, manifest)
+        self._reload_lock = threading.Lock()
+        
+        self.result_cache = None
+        if result_cache_size > 0:
+            self.result_cache = ResultCache(result_cache_size, result_cache_ttl)
         
         # Pesos base por campo
         self.base_weights = {
@@ -48,6 +73,97 @@ class SearchEngine:
         self.confidence_threshold = 0.8
         self.use_uf_filter = True
     
+    @property
+    def indices(self) -> Dict[str, faiss.Index]:
+        return self._snapshot.indices
+    
+    @property
+    def dataframe(self) -> pd.DataFrame:
+        return self._snapshot.dataframe
+    
+    @property
+    def snapshot_version(self) -> Optional[str]:
+        """Versão do snapshot ativo (None se os índices não vieram de um snapshot)"""
+        manifest = self._snapshot.manifest
+        return manifest['version'] if manifest else None
+    
+    def swap_snapshot(self, indices: Dict[str, faiss.Index], dataframe: pd.DataFrame, manifest: Optional[dict] = None):
+        """
+        Troca atomicamente os índices e registros em uso
+        
+        Buscas em andamento terminam sobre o snapshot anterior; as novas já
+        usam o novo.
+        
+        Args:
+            indices: Dicionário com índices FAISS por campo
+            dataframe: DataFrame com endereços
+            manifest: Manifesto do snapshot
+        """
+        self._snapshot = _IndexSnapshot(indices, dataframe, manifest)
+        
+        # Respostas em cache referem-se ao snapshot anterior
+        if self.result_cache is not None:
+            self.result_cache.clear()
+    
+    def cache_stats(self) -> dict:
+        """
+        Métricas do cache de respostas (acertos, falhas, taxa de acerto)
+        
+        Returns:
+            Dicionário com métricas, vazio se o cache estiver desativado
+        """
+        return self.result_cache.stats() if self.result_cache is not None else {}
+    
+    def _cache_key(self, query: Dict[str, str], top_k: int, search_k: int) -> tuple:
+        """
+        Chave normalizada da query para o cache de respostas
+        
+        Queries que só diferem em acentos, caixa, pontuação ou abreviações
+        produzem os mesmos embeddings e, portanto, a mesma resposta.
+        """
+        text_key = tuple(
+            (bool(query.get(f)), self.embedding_service.normalize_text(query.get(f)))
+            for f in ['logradouro', 'bairro', 'cidade']
+        )
+        
+        cep = query.get('cep')
+        cep_key = (bool(cep), cep.replace('-', '').replace('.', '') if isinstance(cep, str) else cep)
+        
+        return text_key + (query.get('uf') or None, cep_key, top_k, search_k)
+    
+    def load_snapshot(self, snapshot_dir: str, background: bool = False, shared: bool = False):
+        """
+        Carrega um novo snapshot e o coloca em uso
+        
+        Args:
+            snapshot_dir: Diretório de um snapshot ou raiz com arquivo CURRENT
+            background: Carrega em uma thread e retorna imediatamente
+            shared: Carrega em buffers somente leitura (ver IndexBuilder.load_indices)
+            
+        Returns:
+            Thread de carregamento se background=True, senão a versão carregada
+        """
+        def _load():
+            with self._reload_lock:
+                builder = IndexBuilder(self.embedding_service)
+                indices, dataframe = builder.load_indices(snapshot_dir, shared=shared)
+                self.swap_snapshot(indices, dataframe, builder.manifest)
+                print(f"Snapshot {self.snapshot_version} em uso")
+                return self.snapshot_version
+        
+        if not background:
+            return _load()
+        
+        def _run():
+            try:
+                _load()
+            except Exception as e:
+                print(f"Falha ao carregar snapshot {snapshot_dir}: {e!r}")
+        
+        thread = threading.Thread(target=_run, name='snapshot-loader', daemon=True)
+        thread.start()
+        return thread
+    
     def _get_dynamic_weights(self, query: Dict[str, str]) -> Dict[str, float]:
         """
         Calcula pesos dinâmicos baseado nos campos presentes na query
@@ -85,7 +201,8 @@ class SearchEngine:
         self, 
         field: str, 
         query_embedding: np.ndarray, 
-        top_k: int = 100
+        top_k: int = 100,
+        snapshot: Optional[_IndexSnapshot] = None
     ) -> tuple:
         """
         Calcula similaridade para um campo específico
@@ -94,11 +211,12 @@ class SearchEngine:
             field: Nome do campo
             query_embedding: Embedding da query
             top_k: Número de resultados para buscar
+            snapshot: Snapshot a consultar (default: o ativo)
             
         Returns:
             Tupla (distâncias, índices)
         """
-        index = self.indices[field]
+        index = (snapshot or self._snapshot).indices[field]
         
         # Busca os top_k mais próximos (menor distância L2)
         query_embedding = query_embedding.reshape(1, -1).astype(np.float32)
@@ -121,7 +239,7 @@ class SearchEngine:
         Returns:
             Score de 0 a 1
         """
-        if not query_cep or not db_cep:
+        if not query_cep or not isinstance(db_cep, str) or not db_cep:
             return 0.0
         
         # Remove formatação
@@ -139,12 +257,100 @@ class SearchEngine:
         
         return 0.0
     
+    @staticmethod
+    def _cep_lookup(snapshot: _IndexSnapshot) -> tuple:
+        """
+        Estruturas de busca por CEP do snapshot, construídas na primeira consulta
+        
+        Arrays de largura fixa (sem um objeto Python por linha), para que
+        possam ser compartilhados entre workers após fork.
+        
+        Args:
+            snapshot: Snapshot consultado
+            
+        Returns:
+            Tupla (linhas ordenadas por CEP, CEPs sem formatação nessa ordem,
+            UF por linha)
+        """
+        if snapshot.cep_index is None:
+            dataframe = snapshot.dataframe
+            ceps = (
+                dataframe['cep'].fillna('').astype(str).str.replace('-', '').str.replace('.', '')
+                .str.encode('ascii', errors='replace').to_numpy(dtype='S')
+            )
+            ufs = dataframe['uf'].fillna('').astype(str).str.encode('ascii', errors='replace').to_numpy(dtype='S')
+            
+            order = np.argsort(ceps, kind='stable').astype(np.int32 if len(ceps) < 2**31 else np.int64)
+            snapshot.cep_index = (order, ceps[order], ufs)
+        return snapshot.cep_index
+    
+    def prepare_cep_index(self):
+        """
+        Constrói já o lookup de CEP do snapshot ativo
+        
+        Por padrão ele é construído na primeira busca só por CEP; no modo
+        prefork deve ser construído no pai, antes do fork, para ser
+        compartilhado pelos workers.
+        """
+        self._cep_lookup(self._snapshot)
+    
+    def _rank_cep_only(
+        self, 
+        query: Dict[str, str], 
+        cep_weight: float,
+        top_k: int,
+        snapshot: _IndexSnapshot
+    ) -> list:
+        """
+        Ordena candidatos de uma query só com CEP: exatos primeiro, depois a região
+        
+        Args:
+            query: Dicionário com campos da query
+            cep_weight: Peso do CEP
+            top_k: Número de resultados a retornar
+            snapshot: Snapshot consultado
+            
+        Returns:
+            Lista de (linha, score, scores por campo)
+        """
+        order, sorted_ceps, ufs = self._cep_lookup(snapshot)
+        query_clean = query['cep'].replace('-', '').replace('.', '').encode('ascii', errors='replace')
+        
+        # CEPs ordenados: exatos e mesma região (5 primeiros dígitos) são
+        # faixas contíguas; a região contém o CEP exato
+        if len(query_clean) >= 5:
+            prefix = query_clean[:5]
+            start = np.searchsorted(sorted_ceps, prefix, side='left')
+            end = np.searchsorted(sorted_ceps, prefix + b'\xff', side='left')
+        else:
+            start = np.searchsorted(sorted_ceps, query_clean, side='left')
+            end = np.searchsorted(sorted_ceps, query_clean, side='right')
+        if start == end:
+            return []
+        
+        # Candidatos na ordem das linhas, como nos demais caminhos
+        by_row = np.argsort(order[start:end], kind='stable')
+        candidates = order[start:end][by_row]
+        # Mesmo critério de _calculate_cep_match: 1.0 exato, 0.5 mesma região
+        cep_scores = np.where(sorted_ceps[start:end][by_row] == query_clean, 1.0, 0.5)
+        
+        if self.use_uf_filter and query.get('uf'):
+            keep = ufs[candidates] == query['uf'].encode('ascii', errors='replace')
+            candidates, cep_scores = candidates[keep], cep_scores[keep]
+        
+        top = np.argsort(-cep_scores, kind='stable')[:top_k]
+        
+        return [
+            (int(idx), float(cep_weight * cep_score), {'cep': float(cep_score)})
+            for idx, cep_score in zip(candidates[top], cep_scores[top])
+        ]
+    
     def search(
         self, 
         query: Dict[str, str], 
         top_k: int = 5,
         search_k: int = 100
-    ) -> str:
+    ) -> SearchResponse:
         """
         Realiza busca vetorial com scoring dinâmico
         
@@ -154,32 +360,183 @@ class SearchEngine:
             search_k: Número de candidatos intermediários por campo
             
         Returns:
-            JSON string com resultados estruturados
+            SearchResponse com os candidatos; serializar com to_json() na
+            borda do serviço
         """
-        # Calcula pesos dinâmicos
-        weights = self._get_dynamic_weights(query)
+        if self.result_cache is None:
+            return self.search_response(query, top_k=top_k, search_k=search_k)
         
-        # Gera embeddings para campos da query
-        query_embeddings = self.embedding_service.embed_address_fields(query)
+        key = self._cache_key(query, top_k, search_k)
+        cached = self.result_cache.get(key)
+        if cached is not None:
+            return cached.with_query(query)
         
-        # Busca por campo e agrega scores
-        candidate_scores = {}
-        field_scores_map = {}
+        # Geração lida antes da busca: uma troca de snapshot durante a busca
+        # impede que esta resposta entre no cache
+        generation = self.result_cache.generation
+        response = self.search_response(query, top_k=top_k, search_k=search_k)
+        self.result_cache.put(key, response.with_query(dict(query)), generation)
+        
+        return response
+    
+    def search_response(
+        self, 
+        query: Dict[str, str], 
+        top_k: int = 5,
+        search_k: int = 100,
+        query_embeddings: Optional[Dict[str, np.ndarray]] = None
+    ) -> SearchResponse:
+        """
+        Realiza busca vetorial sem passar pelo cache de respostas
+        
+        Args:
+            query: Dicionário com campos {logradouro, bairro, cidade, uf, cep}
+            top_k: Número de resultados a retornar
+            search_k: Número de candidatos intermediários por campo
+            query_embeddings: Embeddings já calculados por campo (opcional).
+                Permite buscar sem modelo carregado, como nos shards.
+            
+        Returns:
+            SearchResponse com os candidatos
+        """
+        # Fixa o snapshot no início: uma troca concorrente não afeta esta busca
+        snapshot = self._snapshot
+        
+        # Gera embeddings para campos da query (o modelo só é necessário se
+        # houver campo textual)
+        text_fields = [f for f in ['logradouro', 'bairro', 'cidade'] if query.get(f)]
+        if query_embeddings is None and text_fields:
+            query_embeddings = self.embedding_service.embed_address_fields(query)
+        
+        field_hits = {
+            field: self._calculate_field_similarity(field, query_embeddings[field], search_k, snapshot)
+            for field in text_fields
+        }
+        
+        weights, ranked = self._score_candidates(query, field_hits, top_k, snapshot)
+        
+        results = [
+            AddressMatch(
+                row_id=int(idx),
+                score=float(score),
+                confidence=confidence_level(score, self.confidence_threshold),
+                field_scores=field_scores,
+                dataframe=snapshot.dataframe
+            )
+            for idx, score, field_scores in ranked
+        ]
+        
+        return SearchResponse(results, query, weights)
+    
+    def search_batch(
+        self, 
+        queries: List[Dict[str, str]], 
+        top_k: int = 5,
+        search_k: int = 100
+    ) -> BatchSearchResult:
+        """
+        Realiza busca para um lote de queries
+        
+        Os embeddings de cada campo são gerados em um único encode e cada
+        índice FAISS é consultado uma única vez com todas as queries, o que
+        aproveita o paralelismo interno do torch/FAISS em lotes grandes.
+        
+        Args:
+            queries: Lista de queries {logradouro, bairro, cidade, uf, cep}
+            top_k: Número de resultados a retornar por query
+            search_k: Número de candidatos intermediários por campo
+            
+        Returns:
+            BatchSearchResult colunar (pode ser gravado direto em Parquet)
+        """
+        snapshot = self._snapshot
+        field_hits = [{} for _ in queries]
         
         for field in ['logradouro', 'bairro', 'cidade']:
-            if not query.get(field):
+            positions = [i for i, q in enumerate(queries) if q.get(field)]
+            if not positions:
                 continue
             
-            query_emb = query_embeddings[field]
-            similarities, indices = self._calculate_field_similarity(field, query_emb, search_k)
+            embeddings = self.embedding_service.embed_queries([queries[i][field] for i in positions])
+            distances, indices = snapshot.indices[field].search(embeddings, search_k)
+            similarities = 1.0 / (1.0 + distances)
             
+            for row, i in enumerate(positions):
+                field_hits[i][field] = (similarities[row], indices[row])
+        
+        query_index, rank, row_id, score = [], [], [], []
+        field_scores = {field: [] for field in SCORED_FIELDS}
+        weights_used = []
+        
+        for i, (query, hits) in enumerate(zip(queries, field_hits)):
+            weights, ranked = self._score_candidates(query, hits, top_k, snapshot)
+            weights_used.append(weights)
+            
+            for position, (idx, candidate_score, candidate_field_scores) in enumerate(ranked):
+                query_index.append(i)
+                rank.append(position)
+                row_id.append(idx)
+                score.append(candidate_score)
+                for field in SCORED_FIELDS:
+                    field_scores[field].append(candidate_field_scores.get(field, np.nan))
+        
+        return BatchSearchResult(
+            query_index=np.array(query_index, dtype=np.int32),
+            rank=np.array(rank, dtype=np.int16),
+            row_id=np.array(row_id, dtype=np.int64),
+            score=np.array(score, dtype=np.float32),
+            field_scores={f: np.array(v, dtype=np.float32) for f, v in field_scores.items()},
+            queries=queries,
+            weights_used=weights_used,
+            dataframe=snapshot.dataframe,
+            confidence_threshold=self.confidence_threshold
+        )
+    
+    def _score_candidates(
+        self, 
+        query: Dict[str, str], 
+        field_hits: Dict[str, tuple],
+        top_k: int,
+        snapshot: _IndexSnapshot
+    ) -> tuple:
+        """
+        Agrega scores por campo e CEP e ordena os candidatos
+        
+        Args:
+            query: Dicionário com campos da query
+            field_hits: Tupla (similaridades, índices) por campo textual presente
+            top_k: Número de resultados a retornar
+            snapshot: Snapshot consultado
+            
+        Returns:
+            Tupla (pesos usados, lista de (linha, score, scores por campo))
+        """
+        dataframe = snapshot.dataframe
+        text_fields = list(field_hits.keys())
+        
+        # Calcula pesos dinâmicos
+        weights = self._get_dynamic_weights(query)
+        
+        # Query só com CEP: candidatos vêm do lookup exato/por região do CEP
+        if not text_fields and query.get('cep'):
+            return weights, self._rank_cep_only(query, weights.get('cep', 0.0), top_k, snapshot)
+        
+        # Agrega scores por campo
+        candidate_scores = {}
+        field_scores_map = {}
+        
+        for field, (similarities, indices) in field_hits.items():
             weight = weights.get(field, 0.0)
             
+            # FAISS preenche com -1 as posições sem vizinho (search_k > ntotal)
+            valid = indices >= 0
+            similarities, indices = similarities[valid], indices[valid]
+            
             for idx, sim in zip(indices, similarities):
                 # Filtro por UF se fornecido (aumenta determinismo)
                 if self.use_uf_filter and query.get('uf'):
-                    db_uf = self.dataframe.iloc[idx]['uf']
-                    if db_uf != query['uf']:
+                    db_uf = dataframe.iloc[idx]['uf']
+                    if not isinstance(db_uf, str) or db_uf != query['uf']:
                         continue  # Bloqueia resultados de outros estados
                 
                 if idx not in candidate_scores:
@@ -193,7 +550,7 @@ class SearchEngine:
         if query.get('cep'):
             cep_weight = weights.get('cep', 0.0)
             for idx in candidate_scores.keys():
-                db_cep = self.dataframe.iloc[idx]['cep']
+                db_cep = dataframe.iloc[idx]['cep']
                 cep_score = self._calculate_cep_match(query.get('cep'), db_cep)
                 candidate_scores[idx] += cep_weight * cep_score
                 field_scores_map[idx]['cep'] = cep_score
@@ -205,39 +562,7 @@ class SearchEngine:
             reverse=True
         )[:top_k]
         
-        # Monta resultados
-        results = []
-        for idx, score in sorted_candidates:
-            row = self.dataframe.iloc[idx]
-            
-            # Determina nível de confiança
-            if score >= self.confidence_threshold:
-                confidence = "high"
-            elif score >= 0.6:
-                confidence = "medium"
-            else:
-                confidence = "low"
-            
-            result = {
-                "address": {
-                    "logradouro": row['logradouro'],
-                    "bairro": row['bairro'],
-                    "cidade": row['cidade'],
-                    "uf": row['uf'],
-                    "cep": row['cep']
-                },
-                "score": float(score),
-                "confidence": confidence,
-                "field_scores": field_scores_map.get(idx, {})
-            }
-            results.append(result)
-        
-        # Monta resposta JSON
-        response = {
-            "results": results,
-            "query": query,
-            "total_found": len(results),
-            "weights_used": weights
-        }
-        
-        return json.dumps(response, ensure_ascii=False, indent=2)
+        return weights, [
+            (idx, float(score), field_scores_map.get(idx, {}))
+            for idx, score in sorted_candidates
+        ]
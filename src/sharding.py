@@ -0,0 +1,380 @@
+"""
+Sharding: Busca distribuída por UF entre processos worker (scatter-gather)
+"""
+import json
+import os
+import shutil
+import tempfile
+import time
+import zlib
+import multiprocessing as mp
+from multiprocessing.connection import Client, Listener
+from pathlib import Path
+from threading import Lock
+from typing import Dict, List, Optional
+import pandas as pd
+from .embedding_service import EmbeddingService
+from .index_builder import IndexBuilder
+from .results import AddressMatch, SearchResponse
+
+
+SHARDS_MANIFEST = "shards.json"
+
+
+def shard_for_uf(uf: str, n_shards: int) -> int:
+    """
+    Determina o shard de uma UF por hash estável
+
+    Args:
+        uf: Sigla do estado
+        n_shards: Número total de shards
+
+    Returns:
+        Índice do shard (0 a n_shards - 1)
+    """
+    key = (uf or '').strip().upper().encode('utf-8')
+    return zlib.crc32(key) % n_shards
+
+
+def build_sharded_indices(
+    embedding_service: EmbeddingService,
+    df: pd.DataFrame,
+    output_dir: str,
+    n_shards: int,
+    fields: list = None
+) -> dict:
+    """
+    Divide o DataFrame por UF e constrói/salva os índices de cada shard
+
+    Args:
+        embedding_service: Serviço de embeddings
+        df: DataFrame com colunas [logradouro, bairro, cidade, uf, cep]
+        output_dir: Diretório raiz dos shards
+        n_shards: Número de shards
+        fields: Lista de campos para indexar
+
+    Returns:
+        Manifesto dos shards (UF -> shard)
+    """
+    output_path = Path(output_dir)
+    output_path.mkdir(parents=True, exist_ok=True)
+
+    shard_ids = df['uf'].fillna('').astype(str).map(lambda uf: shard_for_uf(uf, n_shards))
+
+    # Só os shards gravados nesta execução entram no manifesto: diretórios
+    # de builds anteriores (ex.: shard que agora ficou vazio) são ignorados
+    written = []
+    for shard_id in range(n_shards):
+        shard_df = df[shard_ids == shard_id].reset_index(drop=True)
+        if shard_df.empty:
+            continue
+
+        print(f"Shard {shard_id}: {len(shard_df)} endereços")
+        builder = IndexBuilder(embedding_service)
+        builder.build_indices(shard_df, fields)
+        builder.save_indices(str(output_path / f"shard_{shard_id}"))
+        written.append(f"shard_{shard_id}")
+
+    ufs = sorted(df['uf'].dropna().astype(str).unique())
+    manifest = {
+        'n_shards': n_shards,
+        'shards': written,
+        'uf_to_shard': {uf: shard_for_uf(uf, n_shards) for uf in ufs}
+    }
+    with open(output_path / SHARDS_MANIFEST, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+    return manifest
+
+
+def _shard_worker(shard_dir: str, address: str, authkey: bytes):
+    """
+    Processo worker: carrega os índices de um shard e atende buscas
+
+    O worker não carrega o modelo de embeddings; o coordenador envia os
+    embeddings da query já calculados (e confere o modelo de cada shard).
+    """
+    from .search_engine import SearchEngine
+
+    indices, dataframe = IndexBuilder(None).load_indices(shard_dir)
+    engine = SearchEngine(embedding_service=None, indices=indices, dataframe=dataframe)
+
+    listener = Listener(address, family='AF_UNIX', authkey=authkey)
+    try:
+        while True:
+            conn = listener.accept()
+            try:
+                while True:
+                    try:
+                        message = conn.recv()
+                    except EOFError:
+                        break
+
+                    request_id, command, payload = message
+                    if command == 'stop':
+                        return
+
+                    try:
+                        response = engine.search_response(**payload)
+                        # Endereços materializados aqui: o DataFrame do shard não sai do processo
+                        matches = [
+                            (m.row_id, m.score, m.confidence, m.field_scores, m.address)
+                            for m in response
+                        ]
+                        conn.send((request_id, True, (matches, response.weights_used)))
+                    except Exception as e:
+                        conn.send((request_id, False, repr(e)))
+            finally:
+                conn.close()
+    finally:
+        listener.close()
+
+
+class _ShardHandle:
+    """Conexão do coordenador com um worker"""
+
+    def __init__(self, shard_id: int, process, address: str):
+        self.shard_id = shard_id
+        self.process = process
+        self.address = address
+        self.conn = None
+        self.lock = Lock()
+        self.next_request_id = 0
+
+
+class ShardedSearchEngine:
+    """Coordenador de busca: roteia por UF ou faz scatter-gather entre shards"""
+
+    def __init__(
+        self,
+        embedding_service: EmbeddingService,
+        shards_dir: str,
+        shard_timeout: float = 2.0,
+        startup_timeout: float = 120.0
+    ):
+        """
+        Inicializa o coordenador
+
+        Args:
+            embedding_service: Serviço de embeddings (usado só no coordenador)
+            shards_dir: Diretório gerado por build_sharded_indices
+            shard_timeout: Tempo máximo (s) de espera pela resposta de cada shard
+            startup_timeout: Tempo máximo (s) para os workers carregarem os índices
+        """
+        self.embedding_service = embedding_service
+        self.shards_dir = Path(shards_dir)
+        self.shard_timeout = shard_timeout
+        self.startup_timeout = startup_timeout
+
+        with open(self.shards_dir / SHARDS_MANIFEST, 'r', encoding='utf-8') as f:
+            self.manifest = json.load(f)
+
+        self.n_shards = self.manifest['n_shards']
+        self._authkey = os.urandom(16)
+        self._socket_dir = None
+        self._shards: Dict[int, _ShardHandle] = {}
+
+    def start(self):
+        """Inicia um processo worker por shard e conecta via Unix sockets"""
+        if self._shards:
+            return
+
+        self._check_shards()
+
+        ctx = mp.get_context('spawn')
+        self._socket_dir = tempfile.mkdtemp(prefix='dne_shards_')
+
+        for name in self.manifest['shards']:
+            shard_id = int(name.split('_')[-1])
+            address = os.path.join(self._socket_dir, f"{name}.sock")
+            process = ctx.Process(
+                target=_shard_worker,
+                args=(str(self.shards_dir / name), address, self._authkey),
+                daemon=True
+            )
+            process.start()
+            self._shards[shard_id] = _ShardHandle(shard_id, process, address)
+
+        print(f"Aguardando {len(self._shards)} shards carregarem os índices...")
+        deadline = time.monotonic() + self.startup_timeout
+        for handle in self._shards.values():
+            handle.conn = self._connect(handle, deadline)
+
+    def _check_shards(self):
+        """
+        Confere se cada shard foi construído com o modelo do coordenador
+
+        Os workers carregam os índices sem modelo; como os embeddings da
+        query são calculados aqui, a validação do modelo também é feita aqui.
+
+        Raises:
+            ValueError: Se algum shard foi construído com outro modelo/normalização
+        """
+        builder = IndexBuilder(self.embedding_service)
+        for name in self.manifest['shards']:
+            builder.validate_snapshot(str(self.shards_dir / name))
+
+    def _connect(self, handle: _ShardHandle, deadline: float):
+        """Conecta ao socket do worker, aguardando até ele estar disponível"""
+        while True:
+            if not handle.process.is_alive():
+                raise RuntimeError(f"Shard {handle.shard_id} encerrou durante a inicialização")
+            try:
+                return Client(handle.address, family='AF_UNIX', authkey=self._authkey)
+            except (FileNotFoundError, ConnectionRefusedError):
+                if time.monotonic() > deadline:
+                    raise TimeoutError(f"Shard {handle.shard_id} não iniciou a tempo")
+                time.sleep(0.1)
+
+    def close(self):
+        """Encerra os workers e remove os sockets"""
+        for handle in self._shards.values():
+            try:
+                with handle.lock:
+                    handle.conn.send((-1, 'stop', None))
+                    handle.conn.close()
+            except (OSError, AttributeError):
+                pass
+            handle.process.join(timeout=5)
+            if handle.process.is_alive():
+                handle.process.terminate()
+        self._shards = {}
+
+        if self._socket_dir:
+            shutil.rmtree(self._socket_dir, ignore_errors=True)
+            self._socket_dir = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _target_shards(self, query: Dict[str, str]) -> List[int]:
+        """Query com UF vai para um shard; sem UF, para todos"""
+        uf = query.get('uf')
+        if uf:
+            shard_id = shard_for_uf(uf, self.n_shards)
+            return [shard_id] if shard_id in self._shards else []
+        return sorted(self._shards.keys())
+
+    def _send(self, handle: _ShardHandle, payload: dict) -> int:
+        """
+        Envia requisição ao shard, descartando respostas atrasadas pendentes
+
+        Raises:
+            EOFError, OSError: Se a conexão com o worker foi perdida
+        """
+        while handle.conn.poll(0):
+            handle.conn.recv()
+
+        handle.next_request_id += 1
+        handle.conn.send((handle.next_request_id, 'search', payload))
+        return handle.next_request_id
+
+    def _receive(self, handle: _ShardHandle, request_id: int, deadline: float) -> Optional[tuple]:
+        """
+        Aguarda a resposta de uma requisição até o deadline
+
+        Raises:
+            EOFError, OSError: Se a conexão com o worker foi perdida
+        """
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not handle.conn.poll(remaining):
+                return None
+
+            received_id, ok, body = handle.conn.recv()
+            if received_id == request_id:
+                return ok, body
+
+    def search(
+        self,
+        query: Dict[str, str],
+        top_k: int = 5,
+        search_k: int = 100
+    ) -> SearchResponse:
+        """
+        Realiza busca nos shards e combina os top-k de cada um
+
+        Args:
+            query: Dicionário com campos {logradouro, bairro, cidade, uf, cep}
+            top_k: Número de resultados a retornar
+            search_k: Número de candidatos intermediários por campo
+
+        Returns:
+            SearchResponse com os candidatos (row_id é relativo ao shard) e,
+            em extra, os shards consultados, sem resposta e com falha
+        """
+        if not self._shards:
+            self.start()
+
+        # Embeddings calculados uma única vez no coordenador (e só se houver
+        # campo textual; queries só com CEP não carregam o modelo)
+        query_embeddings = None
+        if any(query.get(f) for f in ['logradouro', 'bairro', 'cidade']):
+            query_embeddings = self.embedding_service.embed_address_fields(query)
+        payload = {
+            'query': query,
+            'top_k': top_k,
+            'search_k': search_k,
+            'query_embeddings': query_embeddings
+        }
+
+        targets = [self._shards[i] for i in self._target_shards(query)]
+        locked = []
+        pending = []
+        results = []
+        weights = {}
+        timed_out = []
+        failed = {}
+        try:
+            # Scatter: um worker morto é registrado em failed sem afetar os demais
+            for handle in targets:
+                handle.lock.acquire()
+                locked.append(handle)
+                try:
+                    pending.append((handle, self._send(handle, payload)))
+                except (EOFError, OSError) as e:
+                    failed[handle.shard_id] = repr(e)
+
+            # Gather com timeout por shard
+            deadline = time.monotonic() + self.shard_timeout
+            for handle, request_id in pending:
+                try:
+                    reply = self._receive(handle, request_id, deadline)
+                except (EOFError, OSError) as e:
+                    failed[handle.shard_id] = repr(e)
+                    continue
+
+                if reply is None:
+                    timed_out.append(handle.shard_id)
+                    continue
+
+                ok, body = reply
+                if not ok:
+                    failed[handle.shard_id] = body
+                    continue
+
+                matches, weights = body
+                results.extend(
+                    AddressMatch(row_id, score, confidence, field_scores, address=address)
+                    for row_id, score, confidence, field_scores, address in matches
+                )
+        finally:
+            for handle in locked:
+                handle.lock.release()
+
+        if timed_out:
+            print(f"Shards sem resposta no prazo: {timed_out}")
+        if failed:
+            print(f"Shards com falha: {sorted(failed)}")
+
+        results = sorted(results, key=lambda r: r.score, reverse=True)[:top_k]
+
+        return SearchResponse(results, query, weights, extra={
+            "shards_queried": [h.shard_id for h in targets],
+            "shards_timed_out": timed_out,
+            "shards_failed": failed
+        })